@@ -10,15 +10,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import pickle
+import uuid
 
 from functools import wraps
 
 
 def dump_pickle(obj, filepath):
-    with open(filepath, "wb") as f:
-        # use lower protocol for compatibility between Python 2 and Python 3
-        pickle.dump(obj, file=f, protocol=2)
+    # write to a temporary file and move it into place once it's complete,
+    # so that a crash midway through never leaves a truncated pickle behind,
+    # the temporary file gets a unique name so that processes writing the
+    # same pickle at once don't write into each other's files
+    tmp_filepath = "%s.%s.tmp" % (filepath, uuid.uuid4().hex)
+    # unlike mkstemp's owner-only files, create it with the usual 0o666 so
+    # that the umask gives the pickle the same permissions as any other
+    # file written into a shared cache
+    fd = os.open(tmp_filepath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # protocol 4 frames the output and stores large strings more
+            # compactly, and unlike the newest protocol it can still be read
+            # by every Python 3 sharing the same cache directory
+            pickle.dump(obj, file=f, protocol=4)
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
 
 
 def load_pickle(filepath):
@@ -10,20 +10,55 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from functools import lru_cache
 import logging
+from operator import itemgetter
 from os.path import split, join, exists, splitext
 import sqlite3
 
 import datacache
+import pandas as pd
 from typechecks import require_integer, require_string
-from gtfparse import read_gtf, create_missing_features
+from gtfparse import read_gtf
 
 from .common import memoize
 from .normalization import normalize_chromosome, normalize_strand
 from .locus import Locus
 
 # any time we update the database schema, increment this version number
-DATABASE_SCHEMA_VERSION = 3
+DATABASE_SCHEMA_VERSION = 6
+
+# GTF columns with only a handful of distinct values (chromosomes, strands,
+# feature types, biotypes) which we keep as pandas Categoricals while the
+# GTF is loaded in memory, storing a small integer code per row instead of
+# a pointer to a Python string.
+CATEGORICAL_GTF_COLUMNS = [
+    "seqname",
+    "source",
+    "feature",
+    "strand",
+    "frame",
+    "gene_biotype",
+    "transcript_biotype",
+]
+
+# upper bound on SQLite's page cache for each connection, in KiB. Pages are
+# only allocated as they're read, so this mostly lets repeated queries over
+# a whole annotation database stay in memory.
+SQLITE_CACHE_SIZE_KIB = 256 * 1024
+
+# size in bytes of the region of each database file which SQLite reads
+# through a memory map, rather than copying pages in with read() calls
+SQLITE_MMAP_SIZE = 2**30
+
+# older builds of SQLite refuse statements with more than 999 parameters,
+# so queries over many values are split into batches of at most this size
+MAX_QUERY_PARAMETERS = 999
+
+# number of distinct locus queries whose results each process keeps around,
+# so that repeatedly looking up the same positions doesn't go back to SQLite
+# while lookups of millions of different positions can't grow without bound
+LOCUS_QUERY_CACHE_SIZE = 2**15
 
 
 logger = logging.getLogger(__name__)
@@ -81,9 +116,19 @@ class Database(object):
 
         self.install_string = install_string
         self._connection = None
-        # dictionary mapping table names to sets of columns
+        # dictionary mapping table names to sets of columns, filled in
+        # lazily by `columns` so that each table's schema is only read once
         self._columns = {}
         self._query_cache = {}
+        # each Database gets its own cache of locus queries, since instances
+        # for the same GTF compare equal but may have different tables, and
+        # a cache shared by the class would keep every instance alive
+        self._cached_column_values_at_locus = lru_cache(
+            maxsize=LOCUS_QUERY_CACHE_SIZE
+        )(self._query_column_values_at_locus)
+        # dictionary mapping table names to the length of their longest
+        # entry, filled in lazily by `_max_feature_length`
+        self._max_feature_lengths = {}
 
     def __eq__(self, other):
         return other.__class__ is Database and self.gtf_path == other.gtf_path
@@ -192,6 +237,42 @@ class Database(object):
             result.append(index_group)
         return result
 
+    # columns which are looked up by position (e.g. gene_names_at_locus)
+    # or listed for a whole contig (e.g. gene_names(contig=...)), each of
+    # them gets an index which also contains the locus columns so that
+    # SQLite can answer those queries from the index alone
+    LOCUS_INDEX_COLUMNS = ["seqname", "start", "end", "strand"]
+    LOCUS_QUERY_COLUMNS = {
+        "gene": ["gene_id", "gene_name"],
+        "transcript": ["transcript_id", "transcript_name", "protein_id"],
+        "exon": ["exon_id"],
+    }
+
+    def _covering_indices(self, feature_name, feature_df):
+        """Index groups for a feature's table which cover queries for the
+        values of a column at a locus or on a contig, skipping columns which
+        are missing or entirely null for this feature.
+        """
+        result = []
+        if not set(self.LOCUS_INDEX_COLUMNS).issubset(feature_df.columns):
+            return result
+        for column_name in self.LOCUS_QUERY_COLUMNS.get(feature_name, []):
+            if column_name not in feature_df.columns:
+                continue
+            if feature_df[column_name].isnull().all():
+                continue
+            result.append(self.LOCUS_INDEX_COLUMNS + [column_name])
+        return result
+
+    def clear_cache(self):
+        """
+        Clear query results cached for this database
+        """
+        for memoized_method in [self.query, self.query_feature_values]:
+            memoized_method.clear_cache()
+        self._cached_column_values_at_locus.cache_clear()
+        self._max_feature_lengths = {}
+
     def create(self, overwrite=False):
         """
         Create the local database (including indexing) if it's not
@@ -206,27 +287,30 @@ class Database(object):
         df = self._load_gtf_as_dataframe(
             usecols=self.restrict_gtf_columns, features=self.restrict_gtf_features
         )
-        if hasattr(df, "to_pandas"):
-            df = df.to_pandas()
         all_index_groups = self._all_possible_indices(df.columns)
 
-        if self.restrict_gtf_features:
-            feature_names = self.restrict_gtf_features
-        else:
-            # split single DataFrame into dictionary mapping each unique
-            # feature name onto that subset of the data
-            feature_names = df["feature"].unique()
         dataframes = {}
         # every table gets the same set of indices
         indices_dict = {}
         # if a feature has an ID then make it that table's primary key
         primary_keys = {}
 
-        for feature in feature_names:
-            df_subset = df[df["feature"] == feature]
+        # split single DataFrame into dictionary mapping each unique
+        # feature name onto that subset of the data, grouping on the
+        # categorical feature column takes a single pass over its codes
+        # instead of one comparison of the whole column per feature
+        for feature, df_subset in df.groupby("feature", observed=True, sort=False):
+            if self.restrict_gtf_features and feature not in self.restrict_gtf_features:
+                continue
             if len(df_subset) == 0:
                 continue
-            dataframes[feature] = df_subset
+            # datacache picks sqlite column types from numpy dtypes and
+            # doesn't know about pandas Categoricals, so give it ordinary
+            # object columns
+            categorical_columns = df_subset.select_dtypes(include="category").columns
+            dataframes[feature] = df_subset.astype(
+                {column_name: object for column_name in categorical_columns}
+            )
 
             primary_key = self._get_primary_key(feature, df_subset)
             if primary_key:
@@ -234,7 +318,12 @@ class Database(object):
 
             indices_dict[feature] = self._feature_indices(
                 all_index_groups, primary_key, df_subset
-            )
+            ) + self._covering_indices(feature, df_subset)
+
+        # cached table schemas and query results describe whichever
+        # database this object was connected to before
+        self._columns = {}
+        self.clear_cache()
 
         self._connection = datacache.db_from_dataframes_with_absolute_path(
             db_path=self.local_db_path,
@@ -244,8 +333,25 @@ class Database(object):
             overwrite=overwrite,
             version=DATABASE_SCHEMA_VERSION,
         )
+        # collect statistics about the tables and indices we just built
+        # so that the query planner can choose between them
+        self._connection.execute("ANALYZE")
+        self._connection.commit()
+        self._configure_connection(self._connection)
         return self._connection
 
+    def _configure_connection(self, connection):
+        """
+        Set pragmas for the read-mostly way a database is used once it
+        has been built.
+        """
+        connection.execute("PRAGMA temp_store = MEMORY")
+        connection.execute("PRAGMA cache_size = -%d" % SQLITE_CACHE_SIZE_KIB)
+        connection.execute("PRAGMA mmap_size = %d" % SQLITE_MMAP_SIZE)
+        # nothing writes to a database after it's been built
+        connection.execute("PRAGMA query_only = ON")
+        return connection
+
     def _get_connection(self):
         if self._connection is None:
             if exists(self.local_db_path):
@@ -258,6 +364,8 @@ class Database(object):
                 self._connection = datacache.connect_if_correct_version(
                     self.local_db_path, DATABASE_SCHEMA_VERSION
                 )
+                if self._connection is not None:
+                    self._configure_connection(self._connection)
         return self._connection
 
     @property
@@ -286,12 +394,13 @@ class Database(object):
             return self.create(overwrite=overwrite)
 
     def columns(self, table_name):
-        if self._columns.get(table_name) is None:
+        column_set = self._columns.get(table_name)
+        if column_set is None:
             sql = "PRAGMA table_info(%s)" % table_name
             table_info = self.connection.execute(sql).fetchall()
             column_set = set([info[1] for info in table_info])
             self._columns[table_name] = column_set
-        return self._columns[table_name]
+        return column_set
 
     def column_exists(self, table_name, column_name):
         return column_name in self.columns(table_name)
@@ -309,8 +418,35 @@ class Database(object):
     ):
         """
         Get the non-null values of a column from the database
-        at a particular range of loci
+        at a particular range of loci, results of recent queries are cached
+        since the same positions (e.g. of variants) tend to be looked up
+        repeatedly
         """
+        # the cache holds immutable tuples, so hand each caller its own list
+        return list(
+            self._cached_column_values_at_locus(
+                column_name,
+                feature,
+                contig,
+                position,
+                end=end,
+                strand=strand,
+                distinct=distinct,
+                sorted=sorted,
+            )
+        )
+
+    def _query_column_values_at_locus(
+        self,
+        column_name,
+        feature,
+        contig,
+        position,
+        end=None,
+        strand=None,
+        distinct=False,
+        sorted=False,
+    ):
 
         # TODO: combine with the query method, since they overlap
         # significantly
@@ -339,33 +475,54 @@ class Database(object):
         else:
             distinct_string = ""
 
+        # an entry can only overlap the given range if it starts at most
+        # the length of the longest entry before it, which lets SQLite scan
+        # a narrow range of the (seqname, start, ...) index instead of every
+        # entry on the contig starting before `end`
         query = """
             SELECT %s%s
             FROM %s
             WHERE seqname = ?
             AND start <= ?
+            AND start >= ?
             AND end >= ?
+            AND %s IS NOT NULL
 
         """ % (
             distinct_string,
             column_name,
             feature,
+            column_name,
         )
 
-        query_params = [contig, end, position]
+        min_start = position - self._max_feature_length(feature)
+        query_params = [contig, end, min_start, position]
 
         if strand:
             query += " AND strand = ?"
             query_params.append(strand)
 
-        tuples = self.connection.execute(query, query_params).fetchall()
+        if sorted:
+            # let SQLite sort (and deduplicate, if distinct) the values
+            # together, which it can do straight from a covering index
+            query += " ORDER BY %s" % column_name
 
-        # each result is a tuple, so pull out its first element
-        results = [t[0] for t in tuples if t[0] is not None]
+        return tuple(
+            self.run_sql_query_single_column(query, query_params=query_params)
+        )
 
-        if sorted:
-            results.sort()
-        return results
+    def _max_feature_length(self, feature):
+        """
+        Largest difference between the end and start of any entry in a
+        feature's table.
+        """
+        max_length = self._max_feature_lengths.get(feature)
+        if max_length is None:
+            sql = "SELECT MAX(end - start) FROM %s" % feature
+            (max_length,) = self.connection.execute(sql).fetchone()
+            max_length = max_length or 0
+            self._max_feature_lengths[feature] = max_length
+        return max_length
 
     def distinct_column_values_at_locus(
         self, column, feature, contig, position, end=None, strand=None
@@ -408,6 +565,19 @@ class Database(object):
             sorted=True,
         )
 
+    def _execute(self, sql, query_params):
+        try:
+            return self.connection.execute(sql, query_params)
+        except sqlite3.OperationalError as e:
+            error_message = e.message if hasattr(e, "message") else str(e)
+            logger.warn(
+                'Encountered error "%s" from query "%s" with parameters %s',
+                error_message,
+                sql,
+                query_params,
+            )
+            raise
+
     def run_sql_query(self, sql, required=False, query_params=[]):
         """
         Given an arbitrary SQL query, run it against the database
@@ -425,18 +595,7 @@ class Database(object):
             For each '?' in the query there must be a corresponding value in
             this list.
         """
-        try:
-            cursor = self.connection.execute(sql, query_params)
-        except sqlite3.OperationalError as e:
-            error_message = e.message if hasattr(e, "message") else str(e)
-            logger.warn(
-                'Encountered error "%s" from query "%s" with parameters %s',
-                error_message,
-                sql,
-                query_params,
-            )
-            raise
-        results = cursor.fetchall()
+        results = self._execute(sql, query_params).fetchall()
         if required and not results:
             raise ValueError(
                 "No results found for query:\n%s\nwith parameters: %s"
@@ -445,6 +604,14 @@ class Database(object):
 
         return results
 
+    def run_sql_query_single_column(self, sql, query_params=[]):
+        """
+        Run a SQL query which selects a single column and return a list of
+        that column's values, taken straight from the cursor rather than
+        first building a list of one-element tuples.
+        """
+        return list(map(itemgetter(0), self._execute(sql, query_params)))
+
     @memoize
     def query(
         self,
@@ -502,6 +669,44 @@ class Database(object):
             )
         return results[0]
 
+    def query_many(
+        self,
+        select_column_names,
+        filter_column,
+        filter_values,
+        feature,
+        distinct=False,
+    ):
+        """
+        Construct a SQL query filtered by the feature type and by a column
+        matching any of several values, e.g. to look up a batch of gene IDs
+        with one query per batch instead of one query per ID.
+
+        Each returned row starts with the value of the filter column,
+        followed by the values of `select_column_names`.
+        """
+        # a value repeated in different batches would come back once per
+        # batch, so only ask for each distinct value once
+        filter_values = list(dict.fromkeys(filter_values))
+        results = []
+        for batch_start in range(0, len(filter_values), MAX_QUERY_PARAMETERS):
+            query_params = filter_values[
+                batch_start : batch_start + MAX_QUERY_PARAMETERS
+            ]
+            sql = """
+                SELECT %s%s
+                FROM %s
+                WHERE %s IN (%s)
+            """ % (
+                "distinct " if distinct else "",
+                ", ".join([filter_column] + list(select_column_names)),
+                feature,
+                filter_column,
+                ", ".join(["?"] * len(query_params)),
+            )
+            results.extend(self.run_sql_query(sql, query_params=query_params))
+        return results
+
     @memoize
     def query_feature_values(
         self, column, feature, distinct=True, contig=None, strand=None
@@ -509,6 +714,9 @@ class Database(object):
         """
         Run a SQL query against the sqlite3 database, filtered
         only on the feature type.
+
+        Values on a particular contig are returned in the order of the
+        position of their first entry on that contig.
         """
         query = """
             SELECT %s%s
@@ -531,8 +739,13 @@ class Database(object):
             query += " AND strand = ?"
             query_params.append(strand)
 
-        rows = self.run_sql_query(query, query_params=query_params)
-        return [row[0] for row in rows if row is not None]
+        if contig:
+            # ordering by position alone lets SQLite walk the covering
+            # (seqname, start, end, strand, column) index, which also
+            # makes DISTINCT keep the first entry of each value
+            query += " ORDER BY start, end"
+
+        return self.run_sql_query_single_column(query, query_params=query_params)
 
     def query_distinct_on_contig(self, column_name, feature, contig):
         return self.query_feature_values(
@@ -612,55 +825,156 @@ class Database(object):
         logger.info("Reading GTF from %s", self.gtf_path)
         df = read_gtf(
             self.gtf_path,
-            column_converters={
-                "seqname": normalize_chromosome,
-                "strand": normalize_strand,
-            },
             infer_biotype_column=True,
             usecols=usecols,
             features=features,
         )
+        if hasattr(df, "to_pandas"):
+            df = df.to_pandas()
+
+        for column_name in CATEGORICAL_GTF_COLUMNS:
+            if column_name in df.columns:
+                df[column_name] = df[column_name].astype("category")
+
+        # a GTF only has a few hundred distinct contig names and a couple of
+        # strands, so normalize each distinct value once instead of once per row
+        for column_name, normalize in [
+            ("seqname", normalize_chromosome),
+            ("strand", normalize_strand),
+        ]:
+            if column_name in df.columns:
+                values = df[column_name]
+                normalized_values = {
+                    value: normalize(value) for value in values.cat.categories
+                }
+                # if two raw values normalize to the same thing then mapping
+                # gives back plain objects, so re-encode them
+                df[column_name] = values.map(normalized_values).astype("category")
 
         column_names = set(df.columns)
         expect_gene_feature = features is None or "gene" in features
         expect_transcript_feature = features is None or "transcript" in features
-        observed_features = set(df["feature"])
+        # build the set from the distinct values rather than iterating
+        # over every row of the GTF in Python
+        observed_features = set(df["feature"].unique())
 
         # older Ensembl releases don't have "gene" or "transcript"
         # features, so fill in those rows if they're missing
+        unique_keys = {}
+        extra_columns = {}
         if expect_gene_feature and "gene" not in observed_features:
             # if we have to reconstruct gene feature rows then
             # fill in values for 'gene_name' and 'gene_biotype'
             # but only if they're actually present in the GTF
-            logger.info("Creating missing gene features...")
-
-            df = create_missing_features(
-                dataframe=df,
-                unique_keys={"gene": "gene_id"},
-                extra_columns={
-                    "gene": {"gene_name", "gene_biotype"}.intersection(column_names),
-                },
-                missing_value="",
+            unique_keys["gene"] = "gene_id"
+            extra_columns["gene"] = {"gene_name", "gene_biotype"}.intersection(
+                column_names
             )
-            logger.info("Done.")
 
         if expect_transcript_feature and "transcript" not in observed_features:
-            logger.info("Creating missing transcript features...")
-            df = create_missing_features(
-                dataframe=df,
-                unique_keys={"transcript": "transcript_id"},
-                extra_columns={
-                    "transcript": {
-                        "gene_id",
-                        "gene_name",
-                        "gene_biotype",
-                        "transcript_name",
-                        "transcript_biotype",
-                        "protein_id",
-                    }.intersection(column_names)
-                },
-                missing_value="",
+            unique_keys["transcript"] = "transcript_id"
+            extra_columns["transcript"] = {
+                "gene_id",
+                "gene_name",
+                "gene_biotype",
+                "transcript_name",
+                "transcript_biotype",
+                "protein_id",
+            }.intersection(column_names)
+
+        if unique_keys:
+            # reconstruct all the missing features at once, since adding
+            # them means concatenating onto (and thus copying) the whole
+            # GTF DataFrame
+            logger.info(
+                "Creating missing %s features...", " and ".join(unique_keys.keys())
+            )
+            df = self._create_missing_features(
+                df, unique_keys=unique_keys, extra_columns=extra_columns
             )
             logger.info("Done.")
 
         return df
+
+    def _create_missing_features(
+        self, df, unique_keys, extra_columns, missing_value=""
+    ):
+        """
+        Construct rows for features such as 'gene' or 'transcript' which are
+        missing from the GTF, spanning all the other entries which share the
+        same ID (e.g. all the exons with the same gene_id).
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Parsed GTF entries.
+
+        unique_keys : dict
+            Maps each missing feature name onto the column which identifies
+            it, e.g. {"gene": "gene_id"}.
+
+        extra_columns : dict
+            Maps each missing feature name onto columns whose values are
+            copied into the constructed rows when all the entries sharing
+            an ID agree on them.
+
+        missing_value : str
+            Fill value for all other columns of the constructed rows.
+
+        Returns DataFrame with the constructed rows appended.
+        """
+        new_dataframes = []
+        for feature_name, key in unique_keys.items():
+            key_values = df[key]
+            has_key = key_values.notnull() & (key_values != "")
+            # compute every column of the new rows in a single aggregation
+            # pass over the groups, rather than one group at a time
+            feature_columns = extra_columns.get(feature_name, [])
+            aggregations = {
+                "seqname": ("seqname", "first"),
+                "start": ("start", "min"),
+                "end": ("end", "max"),
+                "strand": ("strand", "first"),
+            }
+            for column_name in feature_columns:
+                aggregations[column_name] = (column_name, "first")
+                aggregations[column_name + ":nunique"] = (column_name, "nunique")
+            groups = df[has_key].groupby(key, sort=True, observed=True)
+            aggregated = groups.agg(**aggregations)
+            new_columns = {
+                key: aggregated.index,
+                "feature": feature_name,
+                "seqname": aggregated["seqname"].values,
+                "start": aggregated["start"].values,
+                "end": aggregated["end"].values,
+                "strand": aggregated["strand"].values,
+            }
+            if "source" in df.columns:
+                # same label gtfparse gives the rows it reconstructs
+                new_columns["source"] = "gtfparse"
+            for column_name in feature_columns:
+                values = aggregated[column_name].astype(object)
+                is_unique = aggregated[column_name + ":nunique"] == 1
+                new_columns[column_name] = values.where(
+                    is_unique, missing_value
+                ).values
+            new_df = pd.DataFrame(new_columns, index=range(len(aggregated)))
+            new_dataframes.append(
+                new_df.reindex(columns=df.columns, fill_value=missing_value)
+            )
+
+        # give the constructed rows the same Categorical dtypes as the
+        # parsed GTF so that concatenating doesn't decode those columns
+        for column_name in df.select_dtypes(include="category").columns:
+            column = df[column_name]
+            new_values = set()
+            for new_df in new_dataframes:
+                new_values.update(new_df[column_name].dropna().unique())
+            new_categories = sorted(new_values.difference(column.cat.categories))
+            if new_categories:
+                column = column.cat.add_categories(new_categories)
+                df[column_name] = column
+            for new_df in new_dataframes:
+                new_df[column_name] = new_df[column_name].astype(column.dtype)
+
+        return pd.concat([df] + new_dataframes, ignore_index=True)
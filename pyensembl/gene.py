@@ -94,12 +94,11 @@ class Gene(LocusWithGenome):
             required=False,
         )
 
-        # We're doing a SQL query for each transcript ID to fetch
-        # its particular information, might be more efficient if we
-        # just get all the columns here, but how do we keep that modular?
-        return [
-            self.genome.transcript_by_id(result[0]) for result in transcript_id_results
-        ]
+        # fetch the information for all the transcripts with batched
+        # queries instead of a separate query for each transcript ID
+        return self.genome.transcripts_by_ids(
+            [result[0] for result in transcript_id_results]
+        )
 
     @memoized_property
     def exons(self):
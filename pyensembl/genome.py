@@ -16,8 +16,8 @@ around an arbitrary genomic database.
 """
 
 
-from os import remove
-from os.path import exists, getsize
+from os import remove, stat
+from os.path import exists
 
 from serializable import Serializable
 
@@ -29,6 +29,24 @@ from .sequence_data import SequenceData
 from .transcript import Transcript
 
 
+def _unique_rows_by_key(rows):
+    """
+    Given rows whose first element is a key (e.g. a gene ID), return a dict
+    mapping each key onto the rest of its row, leaving out keys which
+    occur in more than one row.
+    """
+    result = {}
+    repeated_keys = set()
+    for row in rows:
+        key = row[0]
+        if key in result:
+            repeated_keys.add(key)
+        result[key] = row[1:]
+    for key in repeated_keys:
+        del result[key]
+    return result
+
+
 class Genome(Serializable):
     """
     Bundles together the genomic annotation and sequence data associated with
@@ -252,11 +270,14 @@ class Genome(Serializable):
 
     def required_local_files_exist(self, empty_files_ok=False):
         for path in self.required_local_files():
-            if not exists(path):
+            # a single stat both checks that the file exists and gets its
+            # size, instead of one syscall for each
+            try:
+                size = stat(path).st_size
+            except OSError:
+                return False
+            if not empty_files_ok and size == 0:
                 return False
-            if not empty_files_ok:
-                if getsize(path) == 0:
-                    return False
         return True
 
     def download(self, overwrite=False):
@@ -458,15 +479,20 @@ class Genome(Serializable):
             # GTF and SequenceData objects
             if hasattr(maybe_fn, "clear_cache"):
                 maybe_fn.clear_cache()
+        self._genes.clear()
+        self._transcripts.clear()
+        self._exons.clear()
 
     def delete_index_files(self):
         """
         Delete all data aside from source GTF and FASTA files
         """
         self.clear_cache()
-        db_path = self.db.local_db_path()
+        db_path = self.db.local_db_path
         if exists(db_path):
             remove(db_path)
+        # drop the connection to the deleted database
+        self._db = None
 
     def _all_feature_values(
         self, column, feature, distinct=True, contig=None, strand=None
@@ -522,19 +548,17 @@ class Genome(Serializable):
 
     def genes_at_locus(self, contig, position, end=None, strand=None):
         gene_ids = self.gene_ids_at_locus(contig, position, end=end, strand=strand)
-        return [self.gene_by_id(gene_id) for gene_id in gene_ids]
+        return self.genes_by_ids(gene_ids)
 
     def transcripts_at_locus(self, contig, position, end=None, strand=None):
         transcript_ids = self.transcript_ids_at_locus(
             contig, position, end=end, strand=strand
         )
-        return [
-            self.transcript_by_id(transcript_id) for transcript_id in transcript_ids
-        ]
+        return self.transcripts_by_ids(transcript_ids)
 
     def exons_at_locus(self, contig, position, end=None, strand=None):
         exon_ids = self.exon_ids_at_locus(contig, position, end=end, strand=strand)
-        return [self.exon_by_id(exon_id) for exon_id in exon_ids]
+        return self.exons_by_ids(exon_ids)
 
     def gene_ids_at_locus(self, contig, position, end=None, strand=None):
         return self.db.distinct_column_values_at_locus(
@@ -667,32 +691,52 @@ class Genome(Serializable):
             Only return genes on this strand.
         """
         gene_ids = self.gene_ids(contig=contig, strand=strand)
-        return [self.gene_by_id(gene_id) for gene_id in gene_ids]
+        return self.genes_by_ids(gene_ids)
+
+    def _gene_field_names(self):
+        """
+        Columns of the gene table used to construct Gene objects, leaving
+        out gene_name and gene_biotype if they are not in the database.
+        """
+        field_names = [
+            "seqname",
+            "start",
+            "end",
+            "strand",
+        ]
+        optional_field_names = [
+            "gene_name",
+            "gene_biotype",
+        ]
+        field_names.extend(
+            [
+                name
+                for name in optional_field_names
+                if self.db.column_exists("gene", name)
+            ]
+        )
+        return field_names
+
+    def _gene_from_row(self, gene_id, field_names, row):
+        values = dict(zip(field_names, row))
+        return Gene(
+            gene_id=gene_id,
+            gene_name=values.get("gene_name"),
+            contig=values["seqname"],
+            start=values["start"],
+            end=values["end"],
+            strand=values["strand"],
+            biotype=values.get("gene_biotype"),
+            genome=self,
+        )
 
     def gene_by_id(self, gene_id):
         """
         Construct a Gene object for the given gene ID.
         """
-        if gene_id not in self._genes:
-            field_names = [
-                "seqname",
-                "start",
-                "end",
-                "strand",
-            ]
-            optional_field_names = [
-                "gene_name",
-                "gene_biotype",
-            ]
-            # Do not look for gene_name and gene_biotype if they are
-            # not in the database.
-            field_names.extend(
-                [
-                    name
-                    for name in optional_field_names
-                    if self.db.column_exists("gene", name)
-                ]
-            )
+        gene = self._genes.get(gene_id)
+        if gene is None:
+            field_names = self._gene_field_names()
             result = self.db.query_one(
                 field_names,
                 filter_column="gene_id",
@@ -701,31 +745,34 @@ class Genome(Serializable):
             )
             if not result:
                 raise ValueError("Gene not found: %s" % (gene_id,))
+            gene = self._gene_from_row(gene_id, field_names, result)
+            self._genes[gene_id] = gene
 
-            gene_name, gene_biotype = None, None
-            if len(result) < 4 or len(result) > 6:
-                raise ValueError("Result is not the expected length: %d" % len(result))
-            contig, start, end, strand = result[:4]
-            if len(result) == 5:
-                if "gene_name" in field_names:
-                    gene_name = result[4]
-                else:
-                    gene_biotype = result[4]
-            elif len(result) == 6:
-                gene_name, gene_biotype = result[4:]
-
-            self._genes[gene_id] = Gene(
-                gene_id=gene_id,
-                gene_name=gene_name,
-                contig=contig,
-                start=start,
-                end=end,
-                strand=strand,
-                biotype=gene_biotype,
-                genome=self,
-            )
+        return gene
 
-        return self._genes[gene_id]
+    def genes_by_ids(self, gene_ids):
+        """
+        Construct Gene objects for a list of gene IDs, in the same order,
+        fetching any which aren't already cached with batched queries.
+        Raises a ValueError for an ID which isn't in the database.
+        """
+        gene_ids = list(gene_ids)
+        missing_gene_ids = [
+            gene_id for gene_id in gene_ids if gene_id not in self._genes
+        ]
+        if missing_gene_ids:
+            field_names = self._gene_field_names()
+            rows = self.db.query_many(
+                field_names,
+                filter_column="gene_id",
+                filter_values=missing_gene_ids,
+                feature="gene",
+            )
+            for gene_id, row in _unique_rows_by_key(rows).items():
+                self._genes[gene_id] = self._gene_from_row(gene_id, field_names, row)
+        # anything still missing goes through gene_by_id so that it
+        # raises the same errors as looking up a single gene
+        return [self.gene_by_id(gene_id) for gene_id in gene_ids]
 
     def genes_by_name(self, gene_name):
         """
@@ -734,7 +781,7 @@ class Genome(Serializable):
         for each distinct ID.
         """
         gene_ids = self.gene_ids_of_gene_name(gene_name)
-        return [self.gene_by_id(gene_id) for gene_id in gene_ids]
+        return self.genes_by_ids(gene_ids)
 
     def gene_by_protein_id(self, protein_id):
         """
@@ -848,33 +895,59 @@ class Genome(Serializable):
         chromosome using the `contig` argument.
         """
         transcript_ids = self.transcript_ids(contig=contig, strand=strand)
-        return [
-            self.transcript_by_id(transcript_id) for transcript_id in transcript_ids
+        return self.transcripts_by_ids(transcript_ids)
+
+    def _transcript_field_names(self):
+        """
+        Columns of the transcript table used to construct Transcript objects,
+        leaving out any optional columns which are not in the database.
+        """
+        field_names = [
+            "seqname",
+            "start",
+            "end",
+            "strand",
+            "gene_id",
+        ]
+        optional_field_names = [
+            "transcript_name",
+            "transcript_biotype",
+            "transcript_support_level",
         ]
+        field_names.extend(
+            [
+                name
+                for name in optional_field_names
+                if self.db.column_exists("transcript", name)
+            ]
+        )
+        return field_names
+
+    def _transcript_from_row(self, transcript_id, field_names, row):
+        values = dict(zip(field_names, row))
+        tsl = values.get("transcript_support_level")
+        if not tsl or tsl == "NA":
+            tsl = None
+        else:
+            tsl = int(tsl)
+        return Transcript(
+            transcript_id=transcript_id,
+            transcript_name=values.get("transcript_name"),
+            contig=values["seqname"],
+            start=values["start"],
+            end=values["end"],
+            strand=values["strand"],
+            biotype=values.get("transcript_biotype"),
+            gene_id=values["gene_id"],
+            genome=self,
+            support_level=tsl,
+        )
 
     def transcript_by_id(self, transcript_id):
         """Construct Transcript object with given transcript ID"""
-        if transcript_id not in self._transcripts:
-            optional_field_names = [
-                "transcript_name",
-                "transcript_biotype",
-                "transcript_support_level",
-            ]
-            field_names = [
-                "seqname",
-                "start",
-                "end",
-                "strand",
-                "gene_id",
-            ]
-            # Do not look for the optional fields if they are not in the database.
-            field_names.extend(
-                [
-                    name
-                    for name in optional_field_names
-                    if self.db.column_exists("transcript", name)
-                ]
-            )
+        transcript = self._transcripts.get(transcript_id)
+        if transcript is None:
+            field_names = self._transcript_field_names()
             result = self.db.query_one(
                 select_column_names=field_names,
                 filter_column="transcript_id",
@@ -884,45 +957,44 @@ class Genome(Serializable):
             )
             if not result:
                 raise ValueError("Transcript not found: %s" % (transcript_id,))
+            transcript = self._transcript_from_row(transcript_id, field_names, result)
+            self._transcripts[transcript_id] = transcript
 
-            transcript_name, transcript_biotype, tsl = None, None, None
-            if len(result) < 5 or len(result) > (5 + len(optional_field_names)):
-                raise ValueError("Result is not the expected length: %d" % len(result))
-            contig, start, end, strand, gene_id = result[:5]
-            if len(result) > 5:
-                extra_field_names = [
-                    f for f in optional_field_names if f in field_names
-                ]
-                extra_data = dict(zip(extra_field_names, result[5:]))
-                transcript_name = extra_data.get("transcript_name")
-                transcript_biotype = extra_data.get("transcript_biotype")
-                tsl = extra_data.get("transcript_support_level")
-                if not tsl or tsl == "NA":
-                    tsl = None
-                else:
-                    tsl = int(tsl)
-
-            self._transcripts[transcript_id] = Transcript(
-                transcript_id=transcript_id,
-                transcript_name=transcript_name,
-                contig=contig,
-                start=start,
-                end=end,
-                strand=strand,
-                biotype=transcript_biotype,
-                gene_id=gene_id,
-                genome=self,
-                support_level=tsl,
-            )
-
-        return self._transcripts[transcript_id]
+        return transcript
 
-    def transcripts_by_name(self, transcript_name):
-        transcript_ids = self.transcript_ids_of_transcript_name(transcript_name)
+    def transcripts_by_ids(self, transcript_ids):
+        """
+        Construct Transcript objects for a list of transcript IDs, in the same order,
+        fetching any which aren't already cached with batched queries.
+        Raises a ValueError for an ID which isn't in the database.
+        """
+        transcript_ids = list(transcript_ids)
+        missing_transcript_ids = [
+            transcript_id
+            for transcript_id in transcript_ids
+            if transcript_id not in self._transcripts
+        ]
+        if missing_transcript_ids:
+            field_names = self._transcript_field_names()
+            rows = self.db.query_many(
+                field_names,
+                filter_column="transcript_id",
+                filter_values=missing_transcript_ids,
+                feature="transcript",
+                distinct=True,
+            )
+            for transcript_id, row in _unique_rows_by_key(rows).items():
+                self._transcripts[transcript_id] = self._transcript_from_row(
+                    transcript_id, field_names, row
+                )
         return [
             self.transcript_by_id(transcript_id) for transcript_id in transcript_ids
         ]
 
+    def transcripts_by_name(self, transcript_name):
+        transcript_ids = self.transcript_ids_of_transcript_name(transcript_name)
+        return self.transcripts_by_ids(transcript_ids)
+
     def transcript_by_protein_id(self, protein_id):
         transcript_id = self.transcript_id_of_protein_id(protein_id)
         return self.transcript_by_id(transcript_id)
@@ -1032,41 +1104,73 @@ class Genome(Serializable):
         """
         # DataFrame with single column called "exon_id"
         exon_ids = self.exon_ids(contig=contig, strand=strand)
-        return [self.exon_by_id(exon_id) for exon_id in exon_ids]
+        return self.exons_by_ids(exon_ids)
+
+    # columns of the exon table used to construct Exon objects
+    _EXON_FIELD_NAMES = [
+        "seqname",
+        "start",
+        "end",
+        "strand",
+        "gene_name",
+        "gene_id",
+    ]
+
+    def _exon_from_row(self, exon_id, row):
+        contig, start, end, strand, gene_name, gene_id = row
+        return Exon(
+            exon_id=exon_id,
+            contig=contig,
+            start=start,
+            end=end,
+            strand=strand,
+            gene_name=gene_name,
+            gene_id=gene_id,
+        )
 
     def exon_by_id(self, exon_id):
         """Construct an Exon object from its ID by looking up the exon"s
         properties in the given Database.
         """
-        if exon_id not in self._exons:
-            field_names = [
-                "seqname",
-                "start",
-                "end",
-                "strand",
-                "gene_name",
-                "gene_id",
-            ]
-
-            contig, start, end, strand, gene_name, gene_id = self.db.query_one(
-                select_column_names=field_names,
+        exon = self._exons.get(exon_id)
+        if exon is None:
+            result = self.db.query_one(
+                select_column_names=self._EXON_FIELD_NAMES,
                 filter_column="exon_id",
                 filter_value=exon_id,
                 feature="exon",
                 distinct=True,
             )
+            if not result:
+                raise ValueError("Exon not found: %s" % (exon_id,))
+            exon = self._exon_from_row(exon_id, result)
+            self._exons[exon_id] = exon
 
-            self._exons[exon_id] = Exon(
-                exon_id=exon_id,
-                contig=contig,
-                start=start,
-                end=end,
-                strand=strand,
-                gene_name=gene_name,
-                gene_id=gene_id,
-            )
+        return exon
 
-        return self._exons[exon_id]
+    def exons_by_ids(self, exon_ids):
+        """
+        Construct Exon objects for a list of exon IDs, in the same order,
+        fetching any which aren't already cached with batched queries.
+        Raises a ValueError for an ID which isn't in the database.
+        """
+        exon_ids = list(exon_ids)
+        missing_exon_ids = [
+            exon_id for exon_id in exon_ids if exon_id not in self._exons
+        ]
+        if missing_exon_ids:
+            rows = self.db.query_many(
+                self._EXON_FIELD_NAMES,
+                filter_column="exon_id",
+                filter_values=missing_exon_ids,
+                feature="exon",
+                distinct=True,
+            )
+            for exon_id, row in _unique_rows_by_key(rows).items():
+                self._exons[exon_id] = self._exon_from_row(exon_id, row)
+        # anything still missing goes through exon_by_id so that it
+        # raises the same errors as looking up a single exon
+        return [self.exon_by_id(exon_id) for exon_id in exon_ids]
 
     ###################################################
     #
@@ -21,6 +21,10 @@ class Locus(Serializable):
     on a particular strand of a chromosome/contig.
     """
 
+    # keep the coordinates in slots rather than the instance dictionary,
+    # since many thousands of loci (and their subclasses) may be alive at once
+    __slots__ = ("contig", "start", "end", "strand")
+
     def __init__(self, contig, start, end, strand):
         """
         contig : str
@@ -78,6 +82,9 @@ class Locus(Serializable):
             and self.strand == other.strand
         )
 
+    def __hash__(self):
+        return hash(self.to_tuple())
+
     def to_tuple(self):
         return (self.contig, self.start, self.end, self.strand)
 
@@ -122,15 +129,17 @@ class Locus(Serializable):
         then the offset of position 13 is 7, whereas if the Locus is on the
         positive strand, then the offset is 3.
         """
-        if position > self.end or position < self.start:
+        if self.strand == "+":
+            offset = position - self.start
+        else:
+            offset = self.end - position
+        # the offset is only valid if the position lies within start..end
+        if offset < 0 or offset > self.end - self.start:
             raise ValueError(
                 "Position %d outside valid range %d..%d of %s"
                 % (position, self.start, self.end, self)
             )
-        elif self.on_forward_strand:
-            return position - self.start
-        else:
-            return self.end - position
+        return offset
 
     def offset_range(self, start, end):
         """
@@ -151,21 +160,26 @@ class Locus(Serializable):
         if start < self.start or end > self.end:
             raise ValueError("Range (%d, %d) falls outside %s" % (start, end, self))
 
-        if self.on_forward_strand:
+        if self.strand == "+":
             return (start - self.start, end - self.start)
 
         else:
             return (self.end - end, self.end - start)
 
     def on_contig(self, contig):
-        return normalize_chromosome(contig) == self.contig
+        # self.contig is interned by normalize_chromosome, so names taken
+        # from another locus are usually the identical object and can
+        # skip normalization entirely
+        return contig is self.contig or normalize_chromosome(contig) == self.contig
 
     def on_strand(self, strand):
-        return normalize_strand(strand) == self.strand
+        return strand is self.strand or normalize_strand(strand) == self.strand
 
     @property
     def on_forward_strand(self):
-        return self.on_strand("+")
+        # self.strand is already normalized, so compare it directly rather
+        # than normalizing "+" through on_strand on every call
+        return self.strand == "+"
 
     @property
     def on_positive_strand(self):
@@ -173,7 +187,7 @@ class Locus(Serializable):
 
     @property
     def on_backward_strand(self):
-        return self.on_strand("-")
+        return self.strand == "-"
 
     @property
     def on_negative_strand(self):
@@ -214,13 +228,20 @@ class Locus(Serializable):
         that e.g. chr1:10-10 overlaps with chr1:10-10
         """
         return (
-            self.can_overlap(contig, strand)
-            and self.distance_to_interval(start, end) == 0
+            self.on_contig(contig)
+            and (strand is None or self.on_strand(strand))
+            and start <= self.end
+            and end >= self.start
         )
 
     def overlaps_locus(self, other_locus):
-        return self.overlaps(
-            other_locus.contig, other_locus.start, other_locus.end, other_locus.strand
+        # the other locus already holds a normalized contig and strand,
+        # so compare them directly instead of going through overlaps
+        return (
+            self.contig == other_locus.contig
+            and self.strand == other_locus.strand
+            and other_locus.start <= self.end
+            and other_locus.end >= self.start
         )
 
     def contains(self, contig, start, end, strand=None):
@@ -229,6 +250,9 @@ class Locus(Serializable):
         )
 
     def contains_locus(self, other_locus):
-        return self.contains(
-            other_locus.contig, other_locus.start, other_locus.end, other_locus.strand
+        return (
+            self.contig == other_locus.contig
+            and self.strand == other_locus.strand
+            and other_locus.start >= self.start
+            and other_locus.end <= self.end
         )
@@ -20,6 +20,8 @@ class LocusWithGenome(Locus):
     their shared logic.
     """
 
+    __slots__ = ("genome", "db", "biotype")
+
     def __init__(self, contig, start, end, strand, biotype, genome):
         Locus.__init__(self, contig, start, end, strand)
         self.genome = genome
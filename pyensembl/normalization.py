@@ -14,15 +14,21 @@ from sys import intern
 from typechecks import is_string, is_integer
 
 # Manually memoizing here, since our simple common.memoize function has
-# noticable overhead in this instance.
+# noticable overhead in this instance. The common ways of writing each
+# chromosome are filled in below, so that even the first lookup of one
+# of them skips the checks in normalize_chromosome.
 NORMALIZE_CHROMOSOME_CACHE = {}
 
 
 def normalize_chromosome(c):
-    try:
-        return NORMALIZE_CHROMOSOME_CACHE[c]
-    except KeyError:
-        pass
+    # only exact strings and ints are looked up in (and added to) the cache,
+    # since values such as True or 1.0 compare equal to a cached int and
+    # would otherwise skip the type check below
+    cacheable = type(c) is str or type(c) is int
+    if cacheable:
+        result = NORMALIZE_CHROMOSOME_CACHE.get(c)
+        if result is not None:
+            return result
 
     if not (is_string(c) or is_integer(c)):
         raise TypeError("Chromosome cannot be '%s' : %s" % (c, type(c)))
@@ -47,14 +53,43 @@ def normalize_chromosome(c):
     # (such as parsing GTF files)
     result = intern(result)
 
-    NORMALIZE_CHROMOSOME_CACHE[c] = result
+    if cacheable:
+        NORMALIZE_CHROMOSOME_CACHE[c] = result
 
     return result
 
 
+def _fill_normalize_chromosome_cache():
+    """
+    Cache the common ways of writing each chromosome (e.g. 1, "1", "chr1",
+    "x", "chrX", "mt"), running them through normalize_chromosome so that
+    the cached names are exactly what it would return for them.
+    """
+    for chromosome in [str(i) for i in range(1, 23)] + ["X", "Y", "M", "MT"]:
+        for name in (chromosome, chromosome.lower()):
+            normalize_chromosome(name)
+            normalize_chromosome("chr" + name)
+        if chromosome.isdigit():
+            normalize_chromosome(int(chromosome))
+
+
+_fill_normalize_chromosome_cache()
+
+
+# every accepted way of writing a strand, mapped onto its normalized form
+NORMALIZE_STRAND_DICT = {
+    "+": "+",
+    1: "+",
+    "+1": "+",
+    "1": "+",
+    "-": "-",
+    -1: "-",
+    "-1": "-",
+}
+
+
 def normalize_strand(strand):
-    if strand == "+" or strand == 1 or strand == "+1" or strand == "1":
-        return "+"
-    elif strand == "-" or strand == -1 or strand == "-1":
-        return "-"
-    raise ValueError("Invalid strand: %s" % (strand,))
+    try:
+        return NORMALIZE_STRAND_DICT[strand]
+    except (KeyError, TypeError):
+        raise ValueError("Invalid strand: %s" % (strand,)) from None
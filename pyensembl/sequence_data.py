@@ -54,7 +54,6 @@ class SequenceData(object):
 
     def _init_lazy_fields(self):
         self._fasta_dictionary = None
-        self._fasta_keys = None
 
     def clear_cache(self):
         self._init_lazy_fields()
@@ -69,9 +68,7 @@ class SequenceData(object):
         return str(self)
 
     def __contains__(self, sequence_id):
-        if self._fasta_keys is None:
-            self._fasta_keys = set(self.fasta_dictionary.keys())
-        return sequence_id in self._fasta_keys
+        return sequence_id in self.fasta_dictionary
 
     def __eq__(self, other):
         # test to see if self.fasta_paths and other.fasta_paths contain
@@ -106,10 +103,11 @@ class SequenceData(object):
                     self._add_to_fasta_dictionary(fasta_dictionary_tmp)
                     logger.info("Loaded sequence dictionary from %s", pickle_path)
                     continue
-                except (pickle.UnpicklingError, AttributeError):
-                    # catch either an UnpicklingError or an AttributeError
+                except (pickle.UnpicklingError, AttributeError, ValueError):
+                    # catch either an UnpicklingError, an AttributeError
                     # resulting from pickled objects refering to classes
-                    # that no longer exists
+                    # that no longer exists, or a ValueError from a pickle
+                    # protocol which this version of Python doesn't support
                     logger.warn(
                         "Failed to load %s, attempting to read FASTA directly",
                         pickle_path,
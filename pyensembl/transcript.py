@@ -133,8 +133,13 @@ class Transcript(LocusWithGenome):
         # the exon_number as a 1-based list offset
         exons = [None] * len(exon_numbers_and_ids)
 
-        for exon_number, exon_id in exon_numbers_and_ids:
-            exon = self.genome.exon_by_id(exon_id)
+        # load all of this transcript's exons with batched queries instead
+        # of a separate query for each exon ID
+        exon_objects = self.genome.exons_by_ids(
+            [exon_id for _, exon_id in exon_numbers_and_ids]
+        )
+
+        for (exon_number, _), exon in zip(exon_numbers_and_ids, exon_objects):
             if exon is None:
                 raise ValueError(
                     "Missing exon %s for transcript %s" % (exon_number, self.id)
@@ -0,0 +1,223 @@
+import gc
+from os.path import join
+import weakref
+
+from pytest import raises as assert_raises
+
+from pyensembl import Database, Genome
+from pyensembl.database import MAX_QUERY_PARAMETERS
+
+from .common import TemporaryDirectory, eq_
+from .data import MOUSE_ENSMUSG00000017167_PATH
+
+
+def test_column_values_at_locus_returns_copy():
+    with TemporaryDirectory() as tmpdir:
+        db = Database(MOUSE_ENSMUSG00000017167_PATH, cache_directory_path=tmpdir)
+        db.create()
+        gene_ids = db.distinct_column_values_at_locus(
+            "gene_id", "gene", "11", 101180000
+        )
+        eq_(gene_ids, ["ENSMUSG00000017167"])
+        # mutating a result mustn't change what later lookups return
+        gene_ids.append("ENSMUSG00000000000")
+        eq_(
+            db.distinct_column_values_at_locus("gene_id", "gene", "11", 101180000),
+            ["ENSMUSG00000017167"],
+        )
+
+
+def test_column_values_at_locus_cache_per_database():
+    with TemporaryDirectory() as tmpdir:
+        db = Database(
+            MOUSE_ENSMUSG00000017167_PATH, cache_directory_path=join(tmpdir, "all")
+        )
+        db.create()
+        eq_(
+            db.distinct_column_values_at_locus(
+                "transcript_id", "transcript", "11", 101176041
+            ),
+            ["ENSMUST00000103109", "ENSMUST00000138942"],
+        )
+        # compares equal to the first database, but has no transcript table
+        # and mustn't be handed the other database's cached results
+        genes_only_db = Database(
+            MOUSE_ENSMUSG00000017167_PATH,
+            cache_directory_path=join(tmpdir, "genes"),
+            restrict_gtf_features=["gene"],
+        )
+        genes_only_db.create()
+        with assert_raises(ValueError):
+            genes_only_db.distinct_column_values_at_locus(
+                "transcript_id", "transcript", "11", 101176041
+            )
+
+
+def test_cached_locus_queries_dont_keep_database_alive():
+    with TemporaryDirectory() as tmpdir:
+        db = Database(MOUSE_ENSMUSG00000017167_PATH, cache_directory_path=tmpdir)
+        db.create()
+        eq_(
+            db.distinct_column_values_at_locus("gene_id", "gene", "11", 101180000),
+            ["ENSMUSG00000017167"],
+        )
+        db_ref = weakref.ref(db)
+        del db
+        gc.collect()
+        assert db_ref() is None
+
+
+def test_genome_clear_cache_clears_locus_queries():
+    with TemporaryDirectory() as tmpdir:
+        genome = Genome(
+            reference_name="GRCm38",
+            annotation_name="_test_mouse_ensembl81_subset",
+            gtf_path_or_url=MOUSE_ENSMUSG00000017167_PATH,
+            cache_directory_path=tmpdir,
+        )
+        genome.index()
+        eq_(genome.gene_ids_at_locus("11", 101180000), ["ENSMUSG00000017167"])
+        cache_info = genome.db._cached_column_values_at_locus.cache_info
+        eq_(cache_info().currsize, 1)
+        genome.clear_cache()
+        eq_(cache_info().currsize, 0)
+
+
+def _write_gtf(path, genes, features=("gene", "transcript", "exon")):
+    """
+    Write a GTF with one row of each feature per gene, given tuples of
+    (gene_id, contig, start, end, strand) optionally followed by a dict of
+    extra attributes, which can also replace the default transcript and
+    exon IDs.
+    """
+    with open(path, "w") as f:
+        for gene_id, contig, start, end, strand, *extra in genes:
+            attributes = {
+                "gene_id": gene_id,
+                "transcript_id": "%s-T" % gene_id,
+                "exon_id": "%s-E" % gene_id,
+            }
+            if extra:
+                attributes.update(extra[0])
+            attributes = " ".join(
+                '%s "%s";' % (key, value) for key, value in attributes.items()
+            )
+            for feature in features:
+                f.write(
+                    "\t".join(
+                        [contig, "test", feature, str(start), str(end), "."]
+                        + [strand, ".", attributes]
+                    )
+                    + "\n"
+                )
+
+
+def test_column_values_at_locus_far_upstream_feature():
+    with TemporaryDirectory() as tmpdir:
+        gtf_path = join(tmpdir, "test.gtf")
+        _write_gtf(
+            gtf_path,
+            [
+                ("LONG", "1", 100, 100000, "+"),
+                ("SHORT1", "1", 99000, 99010, "+"),
+                ("SHORT2", "1", 500, 510, "+"),
+            ],
+        )
+        db = Database(gtf_path, cache_directory_path=tmpdir)
+        db.create()
+        # the long gene starts almost 100kb before the queried position
+        eq_(
+            db.distinct_column_values_at_locus("gene_id", "gene", "1", 99005),
+            ["LONG", "SHORT1"],
+        )
+        eq_(
+            db.distinct_column_values_at_locus("gene_id", "gene", "1", 50000),
+            ["LONG"],
+        )
+
+
+def test_create_clears_max_feature_length():
+    with TemporaryDirectory() as tmpdir:
+        gtf_path = join(tmpdir, "test.gtf")
+        _write_gtf(gtf_path, [("GENE", "1", 100, 200, "+")])
+        db = Database(gtf_path, cache_directory_path=tmpdir)
+        db.create()
+        eq_(db.distinct_column_values_at_locus("gene_id", "gene", "1", 5000), [])
+
+        # after rebuilding from a GTF where the gene is much longer, the
+        # lookup range mustn't be limited by the old longest gene
+        _write_gtf(gtf_path, [("GENE", "1", 100, 10000, "+")])
+        db.create(overwrite=True)
+        eq_(
+            db.distinct_column_values_at_locus("gene_id", "gene", "1", 5000),
+            ["GENE"],
+        )
+
+
+def test_query_many_batches():
+    with TemporaryDirectory() as tmpdir:
+        db = Database(MOUSE_ENSMUSG00000017167_PATH, cache_directory_path=tmpdir)
+        db.create()
+        exon_ids = db.query_feature_values("exon_id", "exon")
+        eq_(len(exon_ids), 27)
+        # pad the real IDs with ones that aren't in the database, so that
+        # the values have to be split across several queries, and repeat
+        # the real IDs so that they land in different batches
+        missing_ids = ["ENSMUSE%011d" % i for i in range(MAX_QUERY_PARAMETERS)]
+        rows = db.query_many(
+            ["seqname", "strand"],
+            filter_column="exon_id",
+            filter_values=exon_ids + missing_ids + exon_ids,
+            feature="exon",
+            distinct=True,
+        )
+        eq_(sorted(row[0] for row in rows), sorted(exon_ids))
+        eq_({tuple(row[1:]) for row in rows}, {("11", "+")})
+
+
+def test_missing_features_extra_columns():
+    """
+    Values of extra columns should only be copied onto reconstructed genes
+    and transcripts when all of their exons agree on them.
+    """
+    with TemporaryDirectory() as tmpdir:
+        gtf_path = join(tmpdir, "exons_only.gtf")
+        exons = []
+        for start, end, transcript_id, exon_id, gene_name in [
+            (100, 200, "T1", "E1", "NAME1"),
+            (300, 400, "T1", "E2", "NAME1"),
+            (250, 500, "T2", "E3", "NAME2"),
+        ]:
+            attributes = {
+                "transcript_id": transcript_id,
+                "exon_id": exon_id,
+                "gene_name": gene_name,
+                "gene_biotype": "protein_coding",
+            }
+            exons.append(("G1", "chr2", start, end, "-", attributes))
+        _write_gtf(gtf_path, exons, features=["exon"])
+        db = Database(gtf_path, cache_directory_path=tmpdir)
+        df = db._load_gtf_as_dataframe()
+
+        genes = df[df["feature"] == "gene"]
+        eq_(
+            genes[["gene_id", "seqname", "start", "end", "strand"]].values.tolist(),
+            [["G1", "chr2", 100, 500, "-"]],
+        )
+        # the exons disagree on gene_name, so it's left blank
+        eq_(genes["gene_name"].tolist(), [""])
+        eq_(genes["gene_biotype"].tolist(), ["protein_coding"])
+
+        transcripts = df[df["feature"] == "transcript"].set_index("transcript_id")
+        eq_(transcripts.loc["T1", "start"], 100)
+        eq_(transcripts.loc["T1", "end"], 400)
+        eq_(transcripts.loc["T2", "start"], 250)
+        eq_(transcripts.loc["T2", "end"], 500)
+        eq_(transcripts["gene_id"].tolist(), ["G1", "G1"])
+        eq_(transcripts["gene_name"].tolist(), ["NAME1", "NAME2"])
+
+        for column_name in ["seqname", "feature", "strand", "gene_biotype"]:
+            eq_(df[column_name].dtype.name, "category", column_name)
+        # other attributes stay as plain text columns
+        for column_name in ["gene_id", "transcript_id", "gene_name"]:
+            assert df[column_name].dtype.name != "category", column_name
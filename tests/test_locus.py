@@ -1,5 +1,5 @@
 from pyensembl.locus import Locus
-from pyensembl.normalization import normalize_chromosome
+from pyensembl.normalization import normalize_chromosome, normalize_strand
 
 from pytest import raises as assert_raises
 
@@ -33,6 +33,14 @@ def test_normalize_chromosome():
     with assert_raises(TypeError):
         normalize_chromosome(None)
 
+    # these compare equal to the cached chromosome 1 but still aren't
+    # valid chromosome names
+    with assert_raises(TypeError):
+        normalize_chromosome(1.0)
+
+    with assert_raises(TypeError):
+        normalize_chromosome(True)
+
     with assert_raises(ValueError):
         normalize_chromosome("")
 
@@ -40,6 +48,23 @@ def test_normalize_chromosome():
         normalize_chromosome(0)
 
 
+def test_normalize_strand():
+    for strand in ["+", "+1", "1", 1]:
+        assert normalize_strand(strand) == "+"
+
+    for strand in ["-", "-1", -1]:
+        assert normalize_strand(strand) == "-"
+
+    with assert_raises(ValueError):
+        normalize_strand(".")
+
+    with assert_raises(ValueError):
+        normalize_strand(None)
+
+    with assert_raises(ValueError):
+        normalize_strand([])
+
+
 def test_locus_overlaps():
     locus = Locus("1", 10, 20, "+")
     assert locus.overlaps("1", 10, 20, "+")
@@ -86,6 +111,19 @@ def test_locus_contains():
     assert not locus.contains("1", 10, 20, "-")
 
 
+def test_locus_overlaps_and_contains_locus():
+    locus = Locus("chr1", 10, 20, "+")
+    assert locus.overlaps_locus(Locus("chr1", 15, 30, "+"))
+    assert locus.overlaps_locus(Locus("chr1", 20, 20, "+"))
+    assert not locus.overlaps_locus(Locus("chr1", 21, 30, "+"))
+    assert not locus.overlaps_locus(Locus("chr1", 10, 20, "-"))
+    assert not locus.overlaps_locus(Locus("chr2", 10, 20, "+"))
+    assert locus.contains_locus(Locus("chr1", 10, 20, "+"))
+    assert locus.contains_locus(Locus("chr1", 12, 15, "+"))
+    assert not locus.contains_locus(Locus("chr1", 5, 15, "+"))
+    assert not locus.contains_locus(Locus("chr1", 12, 15, "-"))
+
+
 def test_position_offset():
     forward_locus = Locus("1", 10, 20, "+")
     assert forward_locus.offset(10) == 0
@@ -158,3 +196,10 @@ def test_locus_distance():
     inf = float("inf")
     assert locus_chr1_10_20_pos.distance_to_locus(locus_chr2_21_25_pos) == inf
     assert locus_chr1_10_20_pos.distance_to_locus(locus_chr1_21_25_neg) == inf
+
+
+def test_locus_hash():
+    locus = Locus("1", 10, 20, "+")
+    same_locus = Locus(1, 10, 20, "+1")
+    assert hash(locus) == hash(same_locus)
+    assert len({locus, same_locus, Locus("1", 10, 20, "-")}) == 2
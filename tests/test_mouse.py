@@ -1,3 +1,5 @@
+from pytest import raises as assert_raises
+
 from .common import eq_
 from .data import custom_mouse_genome_grcm38_subset, setup_init_custom_mouse_genome
 
@@ -50,3 +52,106 @@ def test_mouse_ENSMUSG00000017167():
             "GWSPRIGDPNPWLQIDLMKKHRIRAVATQGAFNSWDWVTRYMLLYGDRVDSWTPFYQKGH"
         ),
     )
+
+
+def test_mouse_objects_by_ids():
+    setup_init_custom_mouse_genome()
+    genome = custom_mouse_genome_grcm38_subset
+
+    gene_ids = ["ENSMUSG00000017167", "ENSMUSG00000017167"]
+    genes = genome.genes_by_ids(gene_ids)
+    eq_([gene.id for gene in genes], gene_ids)
+    assert genes[0] is genes[1]
+
+    transcript_ids = [
+        "ENSMUST00000103109",
+        "ENSMUST00000138942",
+        "ENSMUST00000103109",
+    ]
+    transcripts = genome.transcripts_by_ids(transcript_ids)
+    eq_([transcript.id for transcript in transcripts], transcript_ids)
+    eq_(
+        [transcript.start for transcript in transcripts],
+        [101176041, 101170523, 101176041],
+    )
+
+    # results should follow the order of the requested IDs, including
+    # repeats, rather than the order of rows in the database
+    exon_ids = list(reversed(genome.exon_ids())) * 2
+    exons = genome.exons_by_ids(exon_ids)
+    eq_([exon.id for exon in exons], exon_ids)
+    genome.clear_cache()
+    eq_(exons, [genome.exon_by_id(exon_id) for exon_id in exon_ids])
+
+
+def test_mouse_objects_by_ids_missing():
+    setup_init_custom_mouse_genome()
+    genome = custom_mouse_genome_grcm38_subset
+    for lookup_one, lookup_many, known_id in [
+        (genome.gene_by_id, genome.genes_by_ids, "ENSMUSG00000017167"),
+        (genome.transcript_by_id, genome.transcripts_by_ids, "ENSMUST00000103109"),
+        (genome.exon_by_id, genome.exons_by_ids, "ENSMUSE00000760884"),
+    ]:
+        with assert_raises(ValueError) as single_error:
+            lookup_one("NOT_AN_ID")
+        with assert_raises(ValueError) as batch_error:
+            lookup_many([known_id, "NOT_AN_ID"])
+        eq_(str(batch_error.value), str(single_error.value))
+
+
+def test_mouse_batched_collections_match_single_lookups():
+    setup_init_custom_mouse_genome()
+    genome = custom_mouse_genome_grcm38_subset
+    genes = genome.genes()
+    transcripts = genome.transcripts()
+    exons = genome.exons()
+    gene = genome.genes_by_name("Cntnap1")[0]
+    gene_transcripts = gene.transcripts
+    transcript_exons = genome.transcript_by_id("ENSMUST00000138942").exons
+
+    genome.clear_cache()
+    eq_(genes, [genome.gene_by_id(gene_id) for gene_id in genome.gene_ids()])
+    eq_(
+        transcripts,
+        [
+            genome.transcript_by_id(transcript_id)
+            for transcript_id in genome.transcript_ids()
+        ],
+    )
+    eq_(exons, [genome.exon_by_id(exon_id) for exon_id in genome.exon_ids()])
+    eq_(len(gene_transcripts), 2)
+    eq_(
+        gene_transcripts,
+        [
+            genome.transcript_by_id(transcript_id)
+            for transcript_id in genome.transcript_ids_of_gene_id(gene.id)
+        ],
+    )
+    eq_(len(transcript_exons), 3)
+    for exon in transcript_exons:
+        eq_(exon, genome.exon_by_id(exon.id))
+
+
+def test_mouse_feature_values_on_contig_in_position_order():
+    setup_init_custom_mouse_genome()
+    genome = custom_mouse_genome_grcm38_subset
+    # values on a contig come back in the order of their first entry's
+    # position, whichever index SQLite uses to answer the query
+    transcript_ids = ["ENSMUST00000138942", "ENSMUST00000103109"]
+    eq_(genome.transcript_ids(contig="11"), transcript_ids)
+    eq_(genome.transcript_ids(contig="11", strand="+"), transcript_ids)
+    eq_(
+        [transcript.id for transcript in genome.transcripts(contig="11")],
+        transcript_ids,
+    )
+    eq_(
+        genome.exon_ids(contig="11")[:4],
+        [
+            "ENSMUSE00000760884",
+            "ENSMUSE00000243064",
+            "ENSMUSE00000112951",
+            "ENSMUSE00000243052",
+        ],
+    )
+    exon_starts = [exon.start for exon in genome.exons(contig="11")]
+    eq_(exon_starts, sorted(exon_starts))
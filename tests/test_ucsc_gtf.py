@@ -103,3 +103,26 @@ def test_ucsc_refseq_genome():
         )
         ids = set([gene.id for gene in genes_at_locus])
         eq_(set(["NM_001276352", "NR_075077"]), ids)
+
+
+def test_ucsc_gencode_missing_features():
+    with TemporaryDirectory() as tmpdir:
+        db = Database(UCSC_GENCODE_PATH, cache_directory_path=tmpdir)
+        df = db._load_gtf_as_dataframe()
+        exons = df[df["feature"] == "exon"]
+        for feature, key in [("gene", "gene_id"), ("transcript", "transcript_id")]:
+            rows = df[df["feature"] == feature].set_index(key)
+            eq_(len(rows), 7)
+            # each reconstructed row spans all the exons with the same ID
+            for feature_id, feature_exons in exons.groupby(key, observed=True):
+                row = rows.loc[feature_id]
+                eq_(row["start"], feature_exons["start"].min())
+                eq_(row["end"], feature_exons["end"].max())
+                eq_(row["seqname"], feature_exons["seqname"].iloc[0])
+                eq_(row["strand"], feature_exons["strand"].iloc[0])
+                eq_(row["source"], "gtfparse")
+        gene = df[(df["feature"] == "gene") & (df["gene_id"] == "uc057aty.1")]
+        eq_(
+            gene[["seqname", "start", "end", "strand"]].values.tolist(),
+            [["chr1", 29554, 31097, "+"]],
+        )